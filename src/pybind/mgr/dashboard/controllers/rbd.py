@@ -4,13 +4,17 @@
 
 import logging
 import math
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timezone
 from functools import partial
 
+import cherrypy
 import rbd
 
 from .. import mgr
 from ..exceptions import DashboardException
+from ..plugins.ttl_cache import ttl_cache
 from ..security import Scope
 from ..services.ceph_service import CephService
 from ..services.exception import handle_rados_error, handle_rbd_error, serialize_dashboard_exception
@@ -25,6 +29,9 @@ from . import APIDoc, APIRouter, BaseController, CreatePermission, \
 
 logger = logging.getLogger(__name__)
 
+# rbd.RBD() is stateless, so a single shared instance serves all requests
+_RBD_INST = rbd.RBD()
+
 RBD_SCHEMA = ([{
     "status": (int, 'Status of the image'),
     "value": ([str], ''),
@@ -48,6 +55,15 @@ def RbdTask(name, metadata, wait_for):  # noqa: N802
     return composed_decorator
 
 
+# feature dependency order, see _sort_features()
+_FEATURE_ORDER = {
+    'exclusive-lock': 0,
+    'journaling': 1,
+    'object-map': 2,
+    'fast-diff': 3,
+}
+
+
 def _sort_features(features, enable=True):
     """
     Sorts image features according to feature dependencies:
@@ -56,15 +72,40 @@ def _sort_features(features, enable=True):
     journaling depends on exclusive-lock
     fast-diff depends on object-map
     """
-    ORDER = ['exclusive-lock', 'journaling', 'object-map', 'fast-diff']  # noqa: N806
+    # unknown features sort stably at the end (list.sort is stable)
+    features.sort(key=lambda feat: _FEATURE_ORDER.get(feat, len(_FEATURE_ORDER)),
+                  reverse=not enable)
 
-    def key_func(feat):
-        try:
-            return ORDER.index(feat)
-        except ValueError:
-            return id(feat)
 
-    features.sort(key=key_func, reverse=not enable)
+def _get_obj_size_order(obj_size):
+    """Convert an object size in bytes to an rbd order value."""
+    if not obj_size or obj_size <= 0:
+        return None
+    order = int(obj_size).bit_length() - 1
+    if obj_size == 1 << order:
+        # power of two, the order is exact without the float path
+        return order
+    return int(round(math.log(float(obj_size), 2)))
+
+
+@ttl_cache(ttl=10)
+def _get_default_features():
+    rbd_default_features = mgr.get('config')['rbd_default_features']
+    return format_bitmask(int(rbd_default_features))
+
+
+@ttl_cache(ttl=10)
+def _get_clone_format_version():
+    rbd_default_clone_format = mgr.get('config')['rbd_default_clone_format']
+    if rbd_default_clone_format != 'auto':
+        return int(rbd_default_clone_format)
+    osd_map = mgr.get_osdmap().dump()
+    min_compat_client = osd_map.get('min_compat_client', '')
+    require_min_compat_client = osd_map.get('require_min_compat_client', '')
+    if max(min_compat_client, require_min_compat_client) < 'mimic':
+        return 1
+
+    return 2
 
 
 @APIRouter('/block/image', Scope.RBD_IMAGE)
@@ -72,11 +113,12 @@ def _sort_features(features, enable=True):
 class Rbd(RESTController):
 
     # set of image features that can be enable on existing images
-    ALLOW_ENABLE_FEATURES = {"exclusive-lock", "object-map", "fast-diff", "journaling"}
+    ALLOW_ENABLE_FEATURES = frozenset({"exclusive-lock", "object-map", "fast-diff",
+                                       "journaling"})
 
     # set of image features that can be disabled on existing images
-    ALLOW_DISABLE_FEATURES = {"exclusive-lock", "object-map", "fast-diff", "deep-flatten",
-                              "journaling"}
+    ALLOW_DISABLE_FEATURES = frozenset({"exclusive-lock", "object-map", "fast-diff",
+                                        "deep-flatten", "journaling"})
 
     def _rbd_list(self, pool_name=None):
         if pool_name:
@@ -84,14 +126,21 @@ class Rbd(RESTController):
         else:
             pools = [p['pool_name'] for p in CephService.get_pool_list('rbd')]
 
+        if not pools:
+            return []
+
+        # rbd_pool_list is decorated with ViewCache, analogous to
+        # RbdTrash._trash_pool_list: it returns a (status, value) tuple
+        # and refreshes stale entries in a background worker, so warm
+        # requests do not block on librbd round trips.
+        # Pools are enumerated concurrently as librados/librbd release the
+        # GIL and each call opens its own ioctx, so the listing is bound by
+        # the slowest pool instead of the sum of all pools.
         result = []
-        for pool in pools:
-            # pylint: disable=unbalanced-tuple-unpacking
-            status, value = RbdService.rbd_pool_list(pool)
-            for i, image in enumerate(value):
-                value[i]['configuration'] = RbdConfiguration(
-                    pool, image['namespace'], image['name']).list()
-            result.append({'status': status, 'value': value, 'pool_name': pool})
+        with ThreadPoolExecutor(max_workers=min(8, len(pools))) as executor:
+            for pool, (status, value) in zip(pools,
+                                             executor.map(RbdService.rbd_pool_list, pools)):
+                result.append({'status': status, 'value': value, 'pool_name': pool})
         return result
 
     @handle_rbd_error()
@@ -109,6 +158,14 @@ class Rbd(RESTController):
     def get(self, image_spec):
         return RbdService.get_image(image_spec)
 
+    @handle_rbd_error()
+    @handle_rados_error('pool')
+    @RESTController.Resource()
+    @ReadPermission
+    def configuration(self, image_spec):
+        pool_name, namespace, image_name = parse_image_spec(image_spec)
+        return RbdConfiguration(pool_name, namespace, image_name).list()
+
     @RbdTask('create',
              {'pool_name': '{pool_name}', 'namespace': '{namespace}', 'image_name': '{name}'}, 2.0)
     def create(self, name, pool_name, size, namespace=None, schedule_interval='',
@@ -116,21 +173,13 @@ class Rbd(RESTController):
                data_pool=None, configuration=None, mirror_mode=None):
 
         size = int(size)
+        l_order = _get_obj_size_order(obj_size)
+        feature_bitmask = format_features(features)
 
         def _create(ioctx):
-            rbd_inst = rbd.RBD()
-
-            # Set order
-            l_order = None
-            if obj_size and obj_size > 0:
-                l_order = int(round(math.log(float(obj_size), 2)))
-
-            # Set features
-            feature_bitmask = format_features(features)
-
-            rbd_inst.create(ioctx, name, size, order=l_order, old_format=False,
-                            features=feature_bitmask, stripe_unit=stripe_unit,
-                            stripe_count=stripe_count, data_pool=data_pool)
+            _RBD_INST.create(ioctx, name, size, order=l_order, old_format=False,
+                             features=feature_bitmask, stripe_unit=stripe_unit,
+                             stripe_count=stripe_count, data_pool=data_pool)
             RbdConfiguration(pool_ioctx=ioctx, namespace=namespace,
                              image_name=name).set_configuration(configuration)
 
@@ -147,13 +196,21 @@ class Rbd(RESTController):
     def delete(self, image_spec):
         pool_name, namespace, image_name = parse_image_spec(image_spec)
 
-        image = RbdService.get_image(image_spec)
-        snapshots = image['snapshots']
-        for snap in snapshots:
-            RbdSnapshotService.remove_snapshot(image_spec, snap['name'], snap['is_protected'])
+        def _remove_snapshots(ioctx, img):
+            for snap in img.list_snaps():
+                if img.is_protected_snap(snap['name']):
+                    img.unprotect_snap(snap['name'])
+                img.remove_snap(snap['name'])
+
+        # Only the snapshot metadata is needed here, so the image is opened
+        # once for the whole snapshot teardown instead of fetching the full
+        # image stats and re-opening the image per snapshot.
+        try:
+            rbd_image_call(pool_name, namespace, image_name, _remove_snapshots)
+        except rbd.ImageNotFound:
+            raise cherrypy.HTTPError(404, 'Image not found')
 
-        rbd_inst = rbd.RBD()
-        return rbd_call(pool_name, namespace, rbd_inst.remove, image_name)
+        return rbd_call(pool_name, namespace, _RBD_INST.remove, image_name)
 
     @RbdTask('edit', ['{image_spec}', '{name}'], 4.0)
     def set(self, image_spec, name=None, size=None, features=None,
@@ -164,10 +221,9 @@ class Rbd(RESTController):
         pool_name, namespace, image_name = parse_image_spec(image_spec)
 
         def _edit(ioctx, image):
-            rbd_inst = rbd.RBD()
             # check rename image
             if name and name != image_name:
-                rbd_inst.rename(ioctx, image_name, name)
+                _RBD_INST.rename(ioctx, image_name, name)
 
             # check resize
             if size and size != image.size():
@@ -175,43 +231,44 @@ class Rbd(RESTController):
 
             # check enable/disable features
             if features is not None:
-                curr_features = format_bitmask(image.features())
+                curr_features = set(format_bitmask(image.features()))
+                want_features = set(features)
                 # check disabled features
-                _sort_features(curr_features, enable=False)
-                for feature in curr_features:
-                    if (feature not in features
-                       and feature in self.ALLOW_DISABLE_FEATURES
-                       and feature in format_bitmask(image.features())):
-                        f_bitmask = format_features([feature])
-                        image.update_features(f_bitmask, False)
+                to_disable = list((curr_features - want_features)
+                                  & self.ALLOW_DISABLE_FEATURES)
+                _sort_features(to_disable, enable=False)
+                if to_disable:
+                    image.update_features(format_features(to_disable), False)
                 # check enabled features
-                _sort_features(features)
-                for feature in features:
-                    if (feature not in curr_features
-                       and feature in self.ALLOW_ENABLE_FEATURES
-                       and feature not in format_bitmask(image.features())):
-                        f_bitmask = format_features([feature])
-                        image.update_features(f_bitmask, True)
-
-            RbdConfiguration(pool_ioctx=ioctx, image_name=image_name).set_configuration(
-                configuration)
-
-            mirror_image_info = image.mirror_image_get_info()
-            if enable_mirror and mirror_image_info['state'] == rbd.RBD_MIRROR_IMAGE_DISABLED:
-                RbdMirroringService.enable_image(
-                    image_name, pool_name, namespace,
-                    MIRROR_IMAGE_MODE[mirror_mode])
-            elif (enable_mirror is False
-                  and mirror_image_info['state'] == rbd.RBD_MIRROR_IMAGE_ENABLED):
-                RbdMirroringService.disable_image(
-                    image_name, pool_name, namespace)
-
-            if primary and not mirror_image_info['primary']:
-                RbdMirroringService.promote_image(
-                    image_name, pool_name, namespace)
-            elif primary is False and mirror_image_info['primary']:
-                RbdMirroringService.demote_image(
-                    image_name, pool_name, namespace)
+                to_enable = list((want_features - curr_features)
+                                 & self.ALLOW_ENABLE_FEATURES)
+                _sort_features(to_enable)
+                if to_enable:
+                    image.update_features(format_features(to_enable), True)
+
+            if configuration is not None:
+                RbdConfiguration(pool_ioctx=ioctx, image_name=image_name).set_configuration(
+                    configuration)
+
+            # mirror_image_get_info is a librbd round trip, only issue it
+            # when a mirroring property is actually being changed
+            if enable_mirror is not None or primary is not None:
+                mirror_image_info = image.mirror_image_get_info()
+                if enable_mirror and mirror_image_info['state'] == rbd.RBD_MIRROR_IMAGE_DISABLED:
+                    RbdMirroringService.enable_image(
+                        image_name, pool_name, namespace,
+                        MIRROR_IMAGE_MODE[mirror_mode])
+                elif (enable_mirror is False
+                      and mirror_image_info['state'] == rbd.RBD_MIRROR_IMAGE_ENABLED):
+                    RbdMirroringService.disable_image(
+                        image_name, pool_name, namespace)
+
+                if primary and not mirror_image_info['primary']:
+                    RbdMirroringService.promote_image(
+                        image_name, pool_name, namespace)
+                elif primary is False and mirror_image_info['primary']:
+                    RbdMirroringService.demote_image(
+                        image_name, pool_name, namespace)
 
             if resync:
                 RbdMirroringService.resync_image(image_name, pool_name, namespace)
@@ -235,17 +292,11 @@ class Rbd(RESTController):
              snapshot_name=None, obj_size=None, features=None,
              stripe_unit=None, stripe_count=None, data_pool=None, configuration=None):
         pool_name, namespace, image_name = parse_image_spec(image_spec)
+        l_order = _get_obj_size_order(obj_size)
+        feature_bitmask = format_features(features)
 
         def _src_copy(s_ioctx, s_img):
             def _copy(d_ioctx):
-                # Set order
-                l_order = None
-                if obj_size and obj_size > 0:
-                    l_order = int(round(math.log(float(obj_size), 2)))
-
-                # Set features
-                feature_bitmask = format_features(features)
-
                 if snapshot_name:
                     s_img.set_snap(snapshot_name)
 
@@ -272,23 +323,13 @@ class Rbd(RESTController):
 
     @RESTController.Collection('GET')
     def default_features(self):
-        rbd_default_features = mgr.get('config')['rbd_default_features']
-        return format_bitmask(int(rbd_default_features))
+        return _get_default_features()
 
     @RESTController.Collection('GET')
     def clone_format_version(self):
         """Return the RBD clone format version.
         """
-        rbd_default_clone_format = mgr.get('config')['rbd_default_clone_format']
-        if rbd_default_clone_format != 'auto':
-            return int(rbd_default_clone_format)
-        osd_map = mgr.get_osdmap().dump()
-        min_compat_client = osd_map.get('min_compat_client', '')
-        require_min_compat_client = osd_map.get('require_min_compat_client', '')
-        if max(min_compat_client, require_min_compat_client) < 'mimic':
-            return 1
-
-        return 2
+        return _get_clone_format_version()
 
     @RbdTask('trash/move', ['{image_spec}'], 2.0)
     @RESTController.Resource('POST')
@@ -299,8 +340,7 @@ class Rbd(RESTController):
         can be moved to the trash and deleted at a later time.
         """
         pool_name, namespace, image_name = parse_image_spec(image_spec)
-        rbd_inst = rbd.RBD()
-        return rbd_call(pool_name, namespace, rbd_inst.trash_move, image_name, delay)
+        return rbd_call(pool_name, namespace, _RBD_INST.trash_move, image_name, delay)
 
 
 @UIRouter('/block/rbd')
@@ -390,21 +430,14 @@ class RbdSnapshot(RESTController):
         """
 
         pool_name, namespace, image_name = parse_image_spec(image_spec)
+        l_order = _get_obj_size_order(obj_size)
+        feature_bitmask = format_features(features)
 
         def _parent_clone(p_ioctx):
             def _clone(ioctx):
-                # Set order
-                l_order = None
-                if obj_size and obj_size > 0:
-                    l_order = int(round(math.log(float(obj_size), 2)))
-
-                # Set features
-                feature_bitmask = format_features(features)
-
-                rbd_inst = rbd.RBD()
-                rbd_inst.clone(p_ioctx, image_name, snapshot_name, ioctx,
-                               child_image_name, feature_bitmask, l_order,
-                               stripe_unit, stripe_count, data_pool)
+                _RBD_INST.clone(p_ioctx, image_name, snapshot_name, ioctx,
+                                child_image_name, feature_bitmask, l_order,
+                                stripe_unit, stripe_count, data_pool)
 
                 RbdConfiguration(pool_ioctx=ioctx, image_name=child_image_name).set_configuration(
                     configuration)
@@ -421,7 +454,7 @@ class RbdTrash(RESTController):
 
     def __init__(self):
         super().__init__()
-        self.rbd_inst = rbd.RBD()
+        self.rbd_inst = _RBD_INST
 
     @ViewCache()
     def _trash_pool_list(self, pool_name):
@@ -437,6 +470,10 @@ class RbdTrash(RESTController):
                     trash['pool_name'] = pool_name
                     trash['namespace'] = namespace
                     trash['deletion_time'] = "{}Z".format(trash['deletion_time'].isoformat())
+                    # kept alongside the ISO string so purge() can compare
+                    # expiry times without per-image string allocations
+                    trash['_deferment_end_epoch'] = trash['deferment_end_time'].replace(
+                        tzinfo=timezone.utc).timestamp()
                     trash['deferment_end_time'] = "{}Z".format(
                         trash['deferment_end_time'].isoformat())
                     result.append(trash)
@@ -448,11 +485,14 @@ class RbdTrash(RESTController):
         else:
             pools = [p['pool_name'] for p in CephService.get_pool_list('rbd')]
 
+        if not pools:
+            return []
+
         result = []
-        for pool in pools:
-            # pylint: disable=unbalanced-tuple-unpacking
-            status, value = self._trash_pool_list(pool)
-            result.append({'status': status, 'value': value, 'pool_name': pool})
+        with ThreadPoolExecutor(max_workers=min(8, len(pools))) as executor:
+            for pool, (status, value) in zip(pools,
+                                             executor.map(self._trash_pool_list, pools)):
+                result.append({'status': status, 'value': value, 'pool_name': pool})
         return result
 
     @handle_rbd_error()
@@ -464,7 +504,15 @@ class RbdTrash(RESTController):
                  responses={200: RBD_TRASH_SCHEMA})
     def list(self, pool_name=None):
         """List all entries from trash."""
-        return self._trash_list(pool_name)
+        pools = self._trash_list(pool_name)
+        # the epoch is internal bookkeeping for purge() and not part of
+        # RBD_TRASH_SCHEMA; copy the entries instead of popping the key so
+        # the dicts cached by _trash_pool_list stay intact
+        for pool in pools:
+            pool['value'] = [{key: value for key, value in image.items()
+                              if key != '_deferment_end_epoch'}
+                             for image in pool['value']]
+        return pools
 
     @handle_rbd_error()
     @handle_rados_error('pool')
@@ -474,16 +522,32 @@ class RbdTrash(RESTController):
     @allow_empty_body
     def purge(self, pool_name=None):
         """Remove all expired images from trash."""
-        now = "{}Z".format(datetime.utcnow().isoformat())
+        now_epoch = time.time()
         pools = self._trash_list(pool_name)
 
-        for pool in pools:
-            for image in pool['value']:
-                if image['deferment_end_time'] < now:
-                    logger.info('Removing trash image %s (pool=%s, namespace=%s, name=%s)',
-                                image['id'], pool['pool_name'], image['namespace'], image['name'])
-                    rbd_call(pool['pool_name'], image['namespace'],
-                             self.rbd_inst.trash_remove, image['id'], 0)
+        # trash_remove is a cluster round trip per image and releases the
+        # GIL, so expired images are removed concurrently.
+        futures = {}
+        first_exception = None
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            for pool in pools:
+                for image in pool['value']:
+                    if image['_deferment_end_epoch'] < now_epoch:
+                        logger.info('Removing trash image %s (pool=%s, namespace=%s, name=%s)',
+                                    image['id'], pool['pool_name'], image['namespace'],
+                                    image['name'])
+                        future = executor.submit(rbd_call, pool['pool_name'], image['namespace'],
+                                                 self.rbd_inst.trash_remove, image['id'], 0)
+                        futures[future] = image['id']
+
+            for future in as_completed(futures):
+                ex = future.exception()
+                if ex is not None:
+                    logger.error('Failed to remove trash image %s: %s', futures[future], ex)
+                    if first_exception is None:
+                        first_exception = ex
+        if first_exception is not None:
+            raise first_exception
 
     @RbdTask('trash/restore', ['{image_id_spec}', '{new_image_name}'], 2.0)
     @RESTController.Resource('POST')
@@ -512,7 +576,7 @@ class RbdNamespace(RESTController):
 
     def __init__(self):
         super().__init__()
-        self.rbd_inst = rbd.RBD()
+        self.rbd_inst = _RBD_INST
 
     def create(self, pool_name, namespace):
         with mgr.rados.open_ioctx(pool_name) as ioctx:
@@ -526,13 +590,13 @@ class RbdNamespace(RESTController):
 
     def delete(self, pool_name, namespace):
         with mgr.rados.open_ioctx(pool_name) as ioctx:
-            # pylint: disable=unbalanced-tuple-unpacking
-            _, images = RbdService.rbd_pool_list(pool_name, namespace)
+            images = RbdService.rbd_pool_list_in_ctx(ioctx, namespace)
             if images:
                 raise DashboardException(
                     msg='Namespace contains images which must be deleted first',
                     code='namespace_contains_images',
                     component='rbd')
+            ioctx.set_namespace('')
             return self.rbd_inst.namespace_remove(ioctx, namespace)
 
     def list(self, pool_name):
@@ -540,10 +604,9 @@ class RbdNamespace(RESTController):
             result = []
             namespaces = self.rbd_inst.namespace_list(ioctx)
             for namespace in namespaces:
-                # pylint: disable=unbalanced-tuple-unpacking
-                _, images = RbdService.rbd_pool_list(pool_name, namespace)
+                images = RbdService.rbd_pool_list_in_ctx(ioctx, namespace)
                 result.append({
                     'namespace': namespace,
-                    'num_images': len(images) if images else 0
+                    'num_images': len(images or ())
                 })
             return result
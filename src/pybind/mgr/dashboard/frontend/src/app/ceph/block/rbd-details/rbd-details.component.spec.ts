@@ -1,11 +1,15 @@
+import { HttpClientTestingModule } from '@angular/common/http/testing';
 import { ComponentFixture, TestBed } from '@angular/core/testing';
 import { RouterTestingModule } from '@angular/router/testing';
 
 import { NgbNavModule, NgbTooltipModule } from '@ng-bootstrap/ng-bootstrap';
+import { of } from 'rxjs';
 
+import { RbdService } from '~/app/shared/api/rbd.service';
 import { SharedModule } from '~/app/shared/shared.module';
 import { configureTestBed } from '~/testing/unit-test-helper';
 import { RbdConfigurationListComponent } from '../rbd-configuration-list/rbd-configuration-list.component';
+import { RbdFormModel } from '../rbd-form/rbd-form.model';
 import { RbdSnapshotListComponent } from '../rbd-snapshot-list/rbd-snapshot-list.component';
 import { RbdDetailsComponent } from './rbd-details.component';
 
@@ -15,7 +19,13 @@ describe('RbdDetailsComponent', () => {
 
   configureTestBed({
     declarations: [RbdDetailsComponent, RbdSnapshotListComponent, RbdConfigurationListComponent],
-    imports: [SharedModule, NgbTooltipModule, RouterTestingModule, NgbNavModule]
+    imports: [
+      SharedModule,
+      NgbTooltipModule,
+      RouterTestingModule,
+      NgbNavModule,
+      HttpClientTestingModule
+    ]
   });
 
   beforeEach(() => {
@@ -27,4 +37,33 @@ describe('RbdDetailsComponent', () => {
   it('should create', () => {
     expect(component).toBeTruthy();
   });
+
+  describe('configuration loading', () => {
+    let getConfigurationSpy: jasmine.Spy;
+
+    beforeEach(() => {
+      getConfigurationSpy = spyOn(TestBed.inject(RbdService), 'getConfiguration').and.returnValue(
+        of([])
+      );
+      component.selection = new RbdFormModel();
+      component.selection.pool_name = 'rbd';
+      component.selection.name = 'image1';
+    });
+
+    it('should load the configuration when its tab becomes active', () => {
+      component.onActiveIdChange('configuration');
+      expect(getConfigurationSpy).toHaveBeenCalledTimes(1);
+    });
+
+    it('should not load the configuration when another tab becomes active', () => {
+      component.onActiveIdChange('rbd-details');
+      expect(getConfigurationSpy).not.toHaveBeenCalled();
+    });
+
+    it('should not load the configuration without a selected image', () => {
+      component.selection = undefined;
+      component.onActiveIdChange('configuration');
+      expect(getConfigurationSpy).not.toHaveBeenCalled();
+    });
+  });
 });
@@ -2,6 +2,9 @@ import { Component, Input, OnChanges, TemplateRef, ViewChild } from '@angular/co
 
 import { NgbNav } from '@ng-bootstrap/ng-bootstrap';
 
+import { RbdService } from '~/app/shared/api/rbd.service';
+import { RbdConfigurationEntry } from '~/app/shared/models/configuration';
+import { ImageSpec } from '~/app/shared/models/image-spec';
 import { RbdFormModel } from '../rbd-form/rbd-form.model';
 
 @Component({
@@ -22,10 +25,35 @@ export class RbdDetailsComponent implements OnChanges {
   nav: NgbNav;
 
   rbdDashboardUrl: string;
+  configuration: RbdConfigurationEntry[] = [];
+
+  constructor(private rbdService: RbdService) {}
 
   ngOnChanges() {
     if (this.selection) {
       this.rbdDashboardUrl = `rbd-details?var-Pool=${this.selection['pool_name']}&var-Image=${this.selection['name']}`;
+      if (this.nav && this.nav.activeId === 'configuration') {
+        this.loadConfiguration();
+      }
+    }
+  }
+
+  onActiveIdChange(activeId: string) {
+    // Unlike navChange, activeIdChange also fires for the programmatic
+    // select() done by cdStatefulTab when it restores the persisted tab.
+    if (activeId === 'configuration' && this.selection) {
+      this.loadConfiguration();
     }
   }
+
+  loadConfiguration() {
+    const imageSpec = new ImageSpec(
+      this.selection['pool_name'],
+      this.selection['namespace'],
+      this.selection['name']
+    );
+    this.rbdService.getConfiguration(imageSpec).subscribe((configuration) => {
+      this.configuration = configuration;
+    });
+  }
 }
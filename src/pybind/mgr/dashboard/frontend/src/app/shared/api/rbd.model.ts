@@ -19,7 +19,7 @@ export interface RbdImage {
   data_pool: string;
   total_disk_usage: number;
   features: number;
-  configuration: RbdConfigurationEntry[];
+  configuration?: RbdConfigurationEntry[];
   timestamp: string;
   id: string;
   features_name: string[];
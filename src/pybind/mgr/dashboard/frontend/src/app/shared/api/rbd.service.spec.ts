@@ -54,6 +54,12 @@ describe('RbdService', () => {
     expect(req.request.method).toBe('GET');
   });
 
+  it('should call getConfiguration', () => {
+    service.getConfiguration(new ImageSpec('poolName', null, 'rbdName')).subscribe();
+    const req = httpTesting.expectOne('api/block/image/poolName%2FrbdName/configuration');
+    expect(req.request.method).toBe('GET');
+  });
+
   it('should call list', () => {
     service.list().subscribe();
     const req = httpTesting.expectOne('api/block/image');
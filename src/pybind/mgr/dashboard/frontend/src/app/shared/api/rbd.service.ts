@@ -5,6 +5,7 @@ import _ from 'lodash';
 import { map } from 'rxjs/operators';
 
 import { cdEncode, cdEncodeNot } from '../decorators/cd-encode';
+import { RbdConfigurationEntry } from '../models/configuration';
 import { ImageSpec } from '../models/image-spec';
 import { RbdConfigurationService } from '../services/rbd-configuration.service';
 import { RbdPool } from './rbd.model';
@@ -40,23 +41,20 @@ export class RbdService {
     return this.http.get(`api/block/image/${imageSpec.toStringEncoded()}`);
   }
 
+  getConfiguration(imageSpec: ImageSpec) {
+    return this.http
+      .get<RbdConfigurationEntry[]>(`api/block/image/${imageSpec.toStringEncoded()}/configuration`)
+      .pipe(
+        map((configuration) =>
+          configuration.map((option) =>
+            Object.assign(option, this.rbdConfigurationService.getOptionByName(option.name))
+          )
+        )
+      );
+  }
+
   list() {
-    return this.http.get<RbdPool[]>('api/block/image').pipe(
-      map((pools) =>
-        pools.map((pool) => {
-          pool.value.map((image) => {
-            if (!image.configuration) {
-              return image;
-            }
-            image.configuration.map((option) =>
-              Object.assign(option, this.rbdConfigurationService.getOptionByName(option.name))
-            );
-            return image;
-          });
-          return pool;
-        })
-      )
-    );
+    return this.http.get<RbdPool[]>('api/block/image');
   }
 
   copy(imageSpec: ImageSpec, rbd: any) {
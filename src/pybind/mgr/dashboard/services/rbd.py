@@ -3,6 +3,7 @@
 import errno
 import json
 from enum import IntEnum
+from functools import lru_cache
 
 import cherrypy
 import rbd
@@ -84,11 +85,13 @@ def format_features(features):
     return res
 
 
+@lru_cache(maxsize=4096)
 def get_image_spec(pool_name, namespace, rbd_name):
     namespace = '{}/'.format(namespace) if namespace else ''
     return '{}/{}{}'.format(pool_name, namespace, rbd_name)
 
 
+@lru_cache(maxsize=4096)
 def parse_image_spec(image_spec):
     namespace_spec, image_name = image_spec.rsplit('/', 1)
     if '/' in namespace_spec:
@@ -322,7 +325,9 @@ class RbdService(object):
             stat['snapshots'] = []
             for snap in img.list_snaps():
                 try:
-                    snap['mirror_mode'] = MIRROR_IMAGE_MODE(img.mirror_image_get_mode()).name
+                    # mirror_mode was read once when the image was opened,
+                    # no need for another librbd round trip per snapshot
+                    snap['mirror_mode'] = MIRROR_IMAGE_MODE(mirror_mode).name
                 except ValueError as ex:
                     raise DashboardException(f'Unknown RBD Mirror mode: {ex}')
 
@@ -368,8 +373,6 @@ class RbdService(object):
                 stat['total_disk_usage'] = None
                 stat['disk_usage'] = None
 
-            stat['configuration'] = RbdConfiguration(pool_ioctx=ioctx, image_name=image_name).list()
-
             return stat
 
     @classmethod
@@ -437,6 +440,18 @@ class RbdService(object):
                     result.append(stat)
             return result
 
+    @classmethod
+    def rbd_pool_list_in_ctx(cls, ioctx, namespace):
+        """
+        Enumerate the images of a single namespace reusing the caller's
+        already open ioctx instead of opening a new one per call. Only the
+        image references are gathered, not the full image stats.
+        """
+        ioctx.set_namespace(namespace if namespace is not None else '')
+        # list2 returns a lazy ImageIterator without __len__/__bool__,
+        # materialize it so callers can count and test for emptiness
+        return list(cls._rbd_image_refs(ioctx))
+
     @classmethod
     def get_image(cls, image_spec):
         pool_name, namespace, image_name = parse_image_spec(image_spec)
@@ -444,9 +459,14 @@ class RbdService(object):
         if namespace:
             ioctx.set_namespace(namespace)
         try:
-            return cls._rbd_image(ioctx, pool_name, namespace, image_name)
+            stat = cls._rbd_image(ioctx, pool_name, namespace, image_name)
         except rbd.ImageNotFound:
             raise cherrypy.HTTPError(404, 'Image not found')
+        # The image configuration is not returned by the image listing as
+        # it is expensive to gather. It is therefore only included in the
+        # single image stats.
+        stat['configuration'] = RbdConfiguration(pool_ioctx=ioctx, image_name=image_name).list()
+        return stat
 
 
 class RbdSnapshotService(object):
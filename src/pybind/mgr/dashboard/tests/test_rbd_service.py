@@ -141,6 +141,24 @@ class RbdServiceTest(unittest.TestCase):
             'namespace': ''
         }]))
 
+    @mock.patch('dashboard.services.rbd.rbd.RBD')
+    def test_rbd_pool_list_in_ctx(self, rbd_mock):
+        ioctx_mock = MagicMock()
+        rbd_inst_mock = rbd_mock.return_value
+        # rbd.RBD.list2() returns a lazy iterator without __len__/__bool__
+        rbd_inst_mock.list2.return_value = iter([{'name': 'test_rbd', 'id': '3c1a5ee60a88'}])
+
+        images = RbdService.rbd_pool_list_in_ctx(ioctx_mock, 'ns')
+        ioctx_mock.set_namespace.assert_called_once_with('ns')
+        self.assertEqual(images, [{'name': 'test_rbd', 'id': '3c1a5ee60a88'}])
+        self.assertEqual(len(images), 1)
+
+        rbd_inst_mock.list2.return_value = iter([])
+        images = RbdService.rbd_pool_list_in_ctx(ioctx_mock, None)
+        ioctx_mock.set_namespace.assert_called_with('')
+        self.assertEqual(images, [])
+        self.assertFalse(images)
+
     def test_valid_interval(self):
         test_cases = [
             ('15m', False),